@@ -1,24 +1,44 @@
 import streamlit as st
-from cryptography.fernet import Fernet
 from base64 import urlsafe_b64encode, urlsafe_b64decode
-from hashlib import pbkdf2_hmac
+import functools
+import hashlib
+import hmac
+import importlib.util
 import json
 import os
-import random
+import tempfile
+import threading
+import time
+
+try:
+    import orjson  # optional, much faster than the stdlib json module
+except ImportError:
+    orjson = None
+
+try:
+    import fastpbkdf2  # optional C backend, same signature as hashlib
+except ImportError:
+    fastpbkdf2 = None
 
 # --- Constants ---
 DATA_FILE = "data_store.json"
+VAULT_DIR = "vault"  # per-user append-only files holding the encrypted entries
+VAULT_FIELDS = ("encrypted_data", "entry_salts", "entry_iterations", "entries_index")
 MAX_FAILED_ATTEMPTS = 3
+SALT_SIZE = 16
 BACKGROUND_IMAGE = "https://plus.unsplash.com/premium_photo-1700476854144-25da28c4ee9e?q=80&w=1974&auto=format&fit=crop&ixlib=rb-4.0.3&ixid=M3wxMjA3fDB8MHxwaG90by1wYWdlfHx8fGVufDB8fHx8fA%3D%3D"
-PBKDF2_ITERATIONS = 100000
+PBKDF2_ITERATIONS = 600000  # OWASP recommendation for PBKDF2-HMAC-SHA256
+LEGACY_PBKDF2_ITERATIONS = 100000  # records without an iteration count
+PBKDF2_TIME_BUDGET = 0.2  # seconds allowed per key derivation
+PBKDF2_BENCH_ITERATIONS = 10000
+IO_BUFFER_SIZE = 1 << 20
 
 # --- UI Styling ---
-st.markdown(
-    f"""
+CSS_TEMPLATE = """
     <style>
     .stApp {{
         background: linear-gradient(rgba(10, 10, 10, 0.4), rgba(20, 20, 20, 0.4)), 
-                    url('{BACKGROUND_IMAGE}') no-repeat center center fixed;
+                    url('{background_image}') no-repeat center center fixed;
         background-size: cover;
         color: #ffffff;
         font-family: 'Segoe UI', sans-serif;
@@ -73,31 +93,245 @@ st.markdown(
         color: #fff;
     }}
     </style>
-    """,
-    unsafe_allow_html=True,
-)
+    """
+
+@st.cache_resource(show_spinner=False)
+def render_css():
+    # Formatted only on a cache miss; reruns replay the cached element
+    st.markdown(CSS_TEMPLATE.format(background_image=BACKGROUND_IMAGE), unsafe_allow_html=True)
+
+render_css()
 
 # --- Security Functions ---
 def generate_salt():
-    return os.urandom(16)
+    return os.urandom(SALT_SIZE)
+
+def cryptography_pbkdf2_hmac(hash_name, password, salt, iterations, dklen=None):
+    # Imported here so cryptography's bindings load on the first key derivation
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+
+    algorithm = getattr(hashes, hash_name.upper())()
+    kdf = PBKDF2HMAC(algorithm=algorithm, length=dklen or algorithm.digest_size, salt=salt, iterations=iterations)
+    return kdf.derive(password)
+
+@st.cache_resource(show_spinner=False)
+def select_pbkdf2_backend():
+    # Time each available PBKDF2 implementation once per process and keep the
+    # fastest; they all produce identical keys (see readme for SHA-NI builds)
+    backends = [hashlib.pbkdf2_hmac, cryptography_pbkdf2_hmac]
+    if fastpbkdf2 is not None:
+        backends.append(fastpbkdf2.pbkdf2_hmac)
+
+    timings = {}
+    for backend in backends:
+        start = time.perf_counter()
+        backend('sha256', b"benchmark", b"benchmark-salt", PBKDF2_BENCH_ITERATIONS)
+        timings[backend] = time.perf_counter() - start
+    return min(timings, key=timings.get)
+
+@st.cache_resource(show_spinner=False)
+def default_iterations():
+    # Use PBKDF2_ITERATIONS only if this machine derives a key within budget
+    pbkdf2_hmac = select_pbkdf2_backend()
+    start = time.perf_counter()
+    pbkdf2_hmac('sha256', b"x", b"y", PBKDF2_BENCH_ITERATIONS)
+    estimate = (time.perf_counter() - start) * PBKDF2_ITERATIONS / PBKDF2_BENCH_ITERATIONS
+    if estimate <= PBKDF2_TIME_BUDGET:
+        return PBKDF2_ITERATIONS
+    return LEGACY_PBKDF2_ITERATIONS
+
+def derive_key_raw(password, salt, iterations=None):
+    iterations = iterations or default_iterations()
+    pbkdf2_hmac = select_pbkdf2_backend()
+    return pbkdf2_hmac('sha256', password.encode(), salt, iterations)
 
-def derive_key(password, salt, iterations=PBKDF2_ITERATIONS):
-    key = pbkdf2_hmac('sha256', password.encode(), salt, iterations)
-    return urlsafe_b64encode(key).decode()
+def derive_fernet_key(password, salt, iterations=None):
+    # Fernet takes its key as urlsafe base64
+    return urlsafe_b64encode(derive_key_raw(password, salt, iterations)).decode()
+
+class RFernet:
+    # rfernet takes and returns str tokens; the app keeps tokens as bytes
+    def __init__(self, key):
+        from rfernet import Fernet
+        self.fernet = Fernet(key)
+
+    def encrypt(self, data):
+        return self.fernet.encrypt(data).encode()
+
+    def decrypt(self, token):
+        return self.fernet.decrypt(token.decode())
+
+@functools.lru_cache(maxsize=None)
+def fernet_class():
+    # Imported on first use so login-only sessions skip loading Fernet
+    if importlib.util.find_spec("rfernet") is not None:
+        return RFernet  # optional Rust build, faster for small payloads
+    from cryptography.fernet import Fernet
+    return Fernet
+
+def cached_fernet(password, salt, iterations):
+    # Reuse the derived key and Fernet setup within this session; cleared on logout
+    cache = st.session_state.key_cache
+    cache_key = (password, salt.hex(), iterations)
+    if cache_key not in cache:
+        cache[cache_key] = fernet_class()(derive_fernet_key(password, salt, iterations))
+    return cache[cache_key]
 
 # --- Data Handling ---
+def json_loads(buf):
+    if orjson is not None:
+        return orjson.loads(buf)
+    return json.loads(buf)
+
+def json_dumps(data):
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(",", ":")).encode()
+
+@st.cache_resource(show_spinner=False)
+def shared_store():
+    # Process-wide store shared by all sessions; "version" identifies the
+    # DATA_FILE it was last synced with, "lock" guards changes and writes
+    return {"data": {}, "version": None, "lock": threading.Lock()}
+
+def write_file_atomic(path, payload):
+    # Write to a temp file in the same directory, then atomically swap it in
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile("wb", buffering=IO_BUFFER_SIZE, dir=directory, suffix=".tmp", delete=False) as f:
+        try:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        except BaseException:
+            f.close()
+            os.unlink(f.name)
+            raise
+    os.replace(f.name, path)
+
+def read_file(path):
+    # Unbuffered handle, read in a single call sized to the file
+    with open(path, "rb", buffering=0) as f:
+        return f.read(os.fstat(f.fileno()).st_size)
+
+def vault_path(username):
+    name = hashlib.blake2b(username.encode(), digest_size=16).hexdigest()
+    return os.path.join(VAULT_DIR, f"{name}.vault")
+
+def vault_line(token, salt, iterations):
+    # One "<fernet token> <base64 salt> <iterations>" line per entry; tokens stay bytes
+    return b"%s %s %d\n" % (token, urlsafe_b64encode(salt), iterations)
+
+def write_vault_file(username, user):
+    os.makedirs(VAULT_DIR, exist_ok=True)
+    columns = zip(user["encrypted_data"], user["entry_salts"], user["entry_iterations"])
+    write_file_atomic(vault_path(username), b"".join(vault_line(*entry) for entry in columns))
+
+def append_vault_entry(username, token, salt, iterations):
+    # New entries are appended straight to the user's vault file
+    os.makedirs(VAULT_DIR, exist_ok=True)
+    with open(vault_path(username), "a+b") as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell():
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                # Terminate a torn tail so it can't merge with this entry
+                f.write(b"\n")
+        f.write(vault_line(token, salt, iterations))
+
+def read_vault_file(username):
+    path = vault_path(username)
+    if not os.path.exists(path):
+        return [], [], []
+    buf = read_file(path)
+    encrypted_data, entry_salts, entry_iterations = [], [], []
+    # Ignore a trailing partial line left by an interrupted append
+    for line in buf[:buf.rfind(b"\n") + 1].splitlines():
+        fields = line.split(b" ")
+        try:
+            salt = urlsafe_b64decode(fields[1])
+            iterations = int(fields[2]) if len(fields) > 2 else LEGACY_PBKDF2_ITERATIONS
+        except (IndexError, ValueError):
+            continue  # malformed line, e.g. the remains of a torn append
+        if len(fields) > 3 or len(salt) != SALT_SIZE:
+            continue
+        encrypted_data.append(fields[0])
+        entry_salts.append(salt)
+        entry_iterations.append(iterations)
+    return encrypted_data, entry_salts, entry_iterations
+
+def account_snapshot(data):
+    # Copy of the account fields only; call with the store lock held
+    return {username: {k: v for k, v in user.items() if k not in VAULT_FIELDS} for username, user in data.items()}
+
+def ciphertext_key(token):
+    return hashlib.blake2b(token, digest_size=16).hexdigest()
+
+def build_entries_index(encrypted_data):
+    return {ciphertext_key(token): i for i, token in enumerate(encrypted_data)}
+
+def load_user_vault(username, user):
+    user["encrypted_data"], user["entry_salts"], user["entry_iterations"] = read_vault_file(username)
+    user["entries_index"] = build_entries_index(user["encrypted_data"])
+
+def parse_data_file():
+    data = json_loads(read_file(DATA_FILE))
+    for username, user in data.items():
+        entries = user.pop("entries", None)
+        if entries is not None and not os.path.exists(vault_path(username)):
+            # Entries stored inline by older versions; the vault file wins once written
+            user["encrypted_data"] = [e["encrypted_data"].encode() for e in entries]
+            user["entry_salts"] = [urlsafe_b64decode(e["entry_salt"]) for e in entries]
+            user["entry_iterations"] = [LEGACY_PBKDF2_ITERATIONS] * len(entries)
+            user["entries_index"] = build_entries_index(user["encrypted_data"])
+            write_vault_file(username, user)
+        else:
+            load_user_vault(username, user)
+    return data
+
+def data_file_version():
+    try:
+        stat = os.stat(DATA_FILE)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+def sync_store(store):
+    # Merge in accounts written by other processes since the last sync; only
+    # re-parses when DATA_FILE changed, and keeps the dict sessions already hold.
+    # Call with the store lock held; raises json.JSONDecodeError if unreadable
+    version = data_file_version()
+    if version is not None and version != store["version"]:
+        for username, user in parse_data_file().items():
+            store["data"].setdefault(username, user)
+    store["version"] = version
+    return store["data"]
+
 def load_data():
-    if os.path.exists(DATA_FILE):
+    store = shared_store()
+    with store["lock"]:
         try:
-            with open(DATA_FILE, "r") as f:
-                return json.load(f)
+            return sync_store(store)
         except (json.JSONDecodeError, FileNotFoundError):
-            return {}
-    return {}
+            return store["data"]
+
+def reload_user(username):
+    # Pick up entries other processes appended to this user's vault
+    store = shared_store()
+    with store["lock"]:
+        load_user_vault(username, store["data"][username])
 
-def save_data(data):
-    with open(DATA_FILE, "w") as f:
-        json.dump(data, f, indent=4)
+def register_account(username, record):
+    # Returns False if the name is taken here, in DATA_FILE or by a vault file
+    store = shared_store()
+    with store["lock"]:
+        data = sync_store(store)
+        if username in data or os.path.exists(vault_path(username)):
+            return False
+        data[username] = record
+        write_file_atomic(DATA_FILE, json_dumps(account_snapshot(data)))
+        store["version"] = data_file_version()
+    return True
 
 # --- Session Management ---
 if "data_store" not in st.session_state:
@@ -112,17 +346,20 @@ if "authorized" not in st.session_state:
 if "current_user" not in st.session_state:
     st.session_state.current_user = ""
 
+if "key_cache" not in st.session_state:
+    st.session_state.key_cache = {}
+
 # --- Dashboard Page ---
 def dashboard_page():
     st.markdown('<h1 class="dashboard-title">📊 Secure Data Vault</h1>', unsafe_allow_html=True)
-    entries = st.session_state.data_store[st.session_state.current_user]["entries"]
+    encrypted_data = st.session_state.data_store[st.session_state.current_user]["encrypted_data"]
     
     col1, col2, col3 = st.columns(3)
     with col1:
         st.markdown(f"""
         <div class="card" style="text-align: center;">
             <h3>🔢</h3>
-            <h2>{len(entries)}</h2>
+            <h2>{len(encrypted_data)}</h2>
             <p>Total Secrets</p>
         </div>
         """, unsafe_allow_html=True)
@@ -140,27 +377,44 @@ def login_page():
                 st.error("Please fill all fields")
                 return
                 
-            users = st.session_state.data_store
+            users = st.session_state.data_store = load_data()
             if username not in users:
                 password_salt = generate_salt()
-                users[username] = {
+                iterations = default_iterations()
+                password_hash = derive_key_raw(password, password_salt, iterations)
+                record = {
                     "password_salt": urlsafe_b64encode(password_salt).decode(),
-                    "password_hash": derive_key(password, password_salt),
-                    "entries": []
+                    "password_hash": urlsafe_b64encode(password_hash).decode(),
+                    "iterations": iterations,
+                    "encrypted_data": [],
+                    "entry_salts": [],
+                    "entry_iterations": [],
+                    "entries_index": {}
                 }
+                try:
+                    # The name is re-checked under the store lock, against DATA_FILE
+                    # and existing vault files, since another session may have taken it
+                    registered = register_account(username, record)
+                except (json.JSONDecodeError, FileNotFoundError):
+                    st.error("Account data is unreadable, registration is disabled")
+                    return
+                if not registered:
+                    st.error("Username already taken")
+                    return
                 st.success("Account created! Logged in.")
             else:
                 stored_salt = urlsafe_b64decode(users[username]["password_salt"])
-                attempt_hash = derive_key(password, stored_salt)
-                if attempt_hash != users[username]["password_hash"]:
+                iterations = users[username].get("iterations", LEGACY_PBKDF2_ITERATIONS)
+                attempt_hash = derive_key_raw(password, stored_salt, iterations)
+                if not hmac.compare_digest(attempt_hash, urlsafe_b64decode(users[username]["password_hash"])):
                     st.session_state.failed_attempts += 1
                     remaining = MAX_FAILED_ATTEMPTS - st.session_state.failed_attempts
                     st.error(f"Invalid credentials. {remaining} attempts left")
                     return
+                reload_user(username)
             
             st.session_state.current_user = username
             st.session_state.authorized = True
-            save_data(users)
             st.rerun()
             
         st.markdown('</div>', unsafe_allow_html=True)
@@ -179,20 +433,33 @@ def store_data_page():
                 return
 
             entry_salt = generate_salt()
-            key = derive_key(passkey, entry_salt)
-            cipher = Fernet(key)
+            iterations = default_iterations()
+            # Fresh salt every time, so there is nothing worth caching here
+            cipher = fernet_class()(derive_fernet_key(passkey, entry_salt, iterations))
             
-            encrypted_data = cipher.encrypt(data.encode()).decode()
-            new_entry = {
-                "encrypted_data": encrypted_data,
-                "entry_salt": urlsafe_b64encode(entry_salt).decode()
-            }
+            token = cipher.encrypt(data.encode())
             
-            st.session_state.data_store[st.session_state.current_user]["entries"].append(new_entry)
-            save_data(st.session_state.data_store)
+            # The append and the column updates happen under the store lock so a
+            # concurrent reload_user can't see the entry on disk but not in memory;
+            # memory only changes once the entry is on disk
+            user = st.session_state.data_store[st.session_state.current_user]
+            with shared_store()["lock"]:
+                try:
+                    append_vault_entry(st.session_state.current_user, token, entry_salt, iterations)
+                except OSError:
+                    saved = False
+                else:
+                    saved = True
+                    user["entries_index"][ciphertext_key(token)] = len(user["encrypted_data"])
+                    user["encrypted_data"].append(token)
+                    user["entry_salts"].append(entry_salt)
+                    user["entry_iterations"].append(iterations)
+            if not saved:
+                st.error("Could not save data, please try again")
+                return
             
             st.success("Data encrypted and saved!")
-            st.code(encrypted_data)
+            st.code(token.decode())
         
         st.markdown('</div>', unsafe_allow_html=True)
 
@@ -209,19 +476,19 @@ def retrieve_data_page():
                 st.error("All fields required")
                 return
                 
-            entries = st.session_state.data_store[st.session_state.current_user]["entries"]
-            entry = next((e for e in entries if e["encrypted_data"] == encrypted_input), None)
+            user = st.session_state.data_store[st.session_state.current_user]
+            token = encrypted_input.encode()
+            idx = user["entries_index"].get(ciphertext_key(token))
             
-            if not entry:
+            if idx is None or user["encrypted_data"][idx] != token:
                 st.error("Data not found")
                 return
                 
-            entry_salt = urlsafe_b64decode(entry["entry_salt"])
-            key = derive_key(passkey, entry_salt)
+            entry_salt = user["entry_salts"][idx]
             
             try:
-                cipher = Fernet(key)
-                decrypted = cipher.decrypt(encrypted_input.encode()).decode()
+                cipher = cached_fernet(passkey, entry_salt, user["entry_iterations"][idx])
+                decrypted = cipher.decrypt(token).decode()
                 st.success("Decrypted successfully!")
                 st.text_area("Decrypted Data", decrypted, height=150)
             except:
@@ -247,6 +514,7 @@ if st.session_state.authorized:
     if st.sidebar.button("🚪 Logout"):
         st.session_state.authorized = False
         st.session_state.current_user = ""
+        st.session_state.key_cache.clear()
         st.rerun()
     
     current_page = pages.get(st.session_state.get("page", "home"), dashboard_page)[1]